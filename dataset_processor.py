@@ -1,19 +1,64 @@
 import chainlit as cl
+import asyncio
+import concurrent.futures
+import csv
+import hashlib
+import io
 import os
 import json
+import operator
+import stat
 import tempfile
+import time
+from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any
-from unstructured.partition.auto import partition
-from unstructured.documents.elements import Title, NarrativeText, ListItem, Table, Header, Footer, Text
+import aiofiles
+import aiofiles.os
+from typing import List, Dict, Any, Literal
+from concurrent.futures.process import BrokenProcessPool
+from partition_worker import IMG_EXTS, partition_and_structify
 
-# Global variable to store results (since cl.get_session() doesn't exist in this version)
-processed_results = []
+try:
+    import orjson
+except ImportError:  # Optional: fall back to the stdlib encoder
+    orjson = None
+
+# Shared worker pool for partitioning; CPU-bound parsing runs outside the GIL.
+# Replaced by _reset_pool if a worker dies and breaks it
+_POOL = concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count())
+
+# Retries after a broken pool run one at a time, each in a worker of its own
+_RETRY_LOCK = asyncio.Lock()
+
+# Columns of the summary CSV export, pulled from each result with one itemgetter call
+CSV_FIELDS = ('filename', 'element_count', 'word_count', 'file_size', 'file_type')
+_csv_row = operator.itemgetter(*CSV_FIELDS)
+
+# Partition results are cached on disk, keyed by a hash of the file contents
+# plus its extension, which decides how unstructured parses it
+CACHE_DIR = Path.home() / ".cache" / "dataset_processor"
+
+# Bump whenever the cached result layout changes so stale entries are never served
+CACHE_VERSION = 3
+
+# Files larger than this skip the cache: hashing them is slow and their entries are huge
+CACHE_MAX_FILE_SIZE = 256 * 1024 * 1024
+
+# Minimum seconds between progress message updates
+PROGRESS_INTERVAL = 0.25
+
+# Heavy parses (layout detection/OCR) always go to the pool, even for a lone file,
+# so they never hold the server's GIL or take the server down if they crash
+_POOL_ONLY_EXTS = IMG_EXTS | {'.pdf'}
 
 @cl.on_chat_start
 async def start():
     """Initialize the chat session"""
     
+    # Results are stored per session so concurrent users don't overwrite each other
+    cl.user_session.set("results", [])
+    
     # Welcome message with instructions
     welcome_msg = """🚀 **Welcome to Dataset Processor!**
 
@@ -31,49 +76,130 @@ Type `help` for detailed instructions or start processing a file!"""
     
     await cl.Message(content=welcome_msg).send()
 
-async def process_files_from_paths(file_paths: List[str]):
+async def process_files_from_paths(file_paths: List[str], hires: bool = False,
+                                   detail: Literal["full", "summary"] = "full"):
     """Process files from file paths with real-time progress"""
     
-    global processed_results # Access the global variable
-    
     if not file_paths:
         await cl.Message(content="❌ No file paths provided.").send()
         return
     
-    # Validate file paths
+    # Validate file paths without blocking the event loop; keep stats for later
+    stats = await asyncio.gather(*[aiofiles.os.stat(p) for p in file_paths], return_exceptions=True)
     valid_paths = []
-    for path in file_paths:
-        if os.path.exists(path):
-            valid_paths.append(path)
+    file_stats = {}
+    missing = []
+    unreadable = []
+    for path, st in zip(file_paths, stats):
+        if isinstance(st, Exception):
+            # OSError for missing files, ValueError for paths like ones with a NUL byte
+            missing.append(path)
+        elif stat.S_ISDIR(st.st_mode):
+            # Expand directories to the files directly inside them
+            try:
+                entries = await asyncio.to_thread(_scan_directory, path)
+            except OSError:
+                unreadable.append(path)
+                continue
+            for entry_path, entry_stat in entries:
+                valid_paths.append(entry_path)
+                file_stats[entry_path] = entry_stat
         else:
-            await cl.Message(content=f"⚠️ **Warning**: File not found: {path}").send()
+            valid_paths.append(path)
+            file_stats[path] = st
+    
+    if missing:
+        await cl.Message(content="⚠️ **Warning**: File not found:\n" + "\n".join(f"• {p}" for p in missing)).send()
+    
+    if unreadable:
+        await cl.Message(content="⚠️ **Warning**: Folder could not be read:\n" + "\n".join(f"• {p}" for p in unreadable)).send()
     
     if not valid_paths:
         await cl.Message(content="❌ No valid file paths found. Please check your paths and try again.").send()
         return
     
-    await cl.Message(content=f"🔄 **Starting to process {len(valid_paths)} files...**").send()
-    
-    results = []
     total_files = len(valid_paths)
+    names = [os.path.basename(p) for p in valid_paths]
     
-    for i, file_path in enumerate(valid_paths):
-        try:
-            await cl.Message(content=f"📄 **Processing file {i+1}/{total_files}**: {os.path.basename(file_path)}").send()
-            
-            # Process the file
-            result = await process_single_file_from_path(file_path)
-            results.append(result)
-            
-            await cl.Message(content=f"✅ **Successfully processed**: {os.path.basename(file_path)}").send()
-            
-        except Exception as e:
-            error_msg = f"❌ **Error processing {os.path.basename(file_path)}**: {str(e)}"
+    # One progress message for the whole batch, updated in place. It shows
+    # counts and the latest file started, so its size doesn't grow with the batch
+    counts = {"queued": total_files, "running": 0, "done": 0, "failed": 0}
+    current = None
+    last_flush = 0.0
+    pending_flush = None
+    
+    def render_progress() -> str:
+        lines = [
+            f"🔄 **Processing {total_files} files...**",
+            "",
+            f"⏳ Queued: {counts['queued']}",
+            f"📄 Processing: {counts['running']}",
+            f"✅ Successfully processed: {counts['done']}",
+            f"❌ Failed: {counts['failed']}",
+        ]
+        if counts['running']:
+            lines += ["", f"**Current file**: {current}"]
+        return "\n".join(lines)
+    
+    progress_msg = cl.Message(content=render_progress())
+    await progress_msg.send()
+    
+    async def refresh_progress(force: bool = False):
+        # Throttle websocket updates; many files can change state at once
+        nonlocal last_flush, pending_flush
+        now = time.monotonic()
+        if force or now - last_flush >= PROGRESS_INTERVAL:
+            if pending_flush is not None:
+                pending_flush.cancel()
+                pending_flush = None
+            last_flush = now
+            progress_msg.content = render_progress()
+            await progress_msg.update()
+        elif pending_flush is None:
+            # Throttled: schedule a trailing flush so no change stays hidden past the interval
+            pending_flush = asyncio.create_task(trailing_flush(last_flush + PROGRESS_INTERVAL - now))
+    
+    async def trailing_flush(delay: float):
+        nonlocal pending_flush
+        await asyncio.sleep(delay)
+        pending_flush = None
+        await refresh_progress(force=True)
+    
+    # Parse files concurrently, capped so we don't oversubscribe the machine
+    sem = asyncio.Semaphore(os.cpu_count() or 1)
+    
+    async def _one(i: int, file_path: str) -> Dict[str, Any]:
+        async with sem:
+            nonlocal current
+            counts['queued'] -= 1
+            counts['running'] += 1
+            current = f"{names[i]} ({i+1}/{total_files})"
+            await refresh_progress()
+            try:
+                result = await process_single_file_from_path(file_path, hires, file_stats[file_path],
+                                                             use_pool=total_files > 1, detail=detail)
+            except Exception:
+                counts['running'] -= 1
+                counts['failed'] += 1
+                raise
+            counts['running'] -= 1
+            counts['done'] += 1
+            await refresh_progress()
+            return result
+    
+    outcomes = await asyncio.gather(*[_one(i, p) for i, p in enumerate(valid_paths)], return_exceptions=True)
+    await refresh_progress(force=True)
+    
+    results = []
+    for name, outcome in zip(names, outcomes):
+        if isinstance(outcome, Exception):
+            error_msg = f"❌ **Error processing {name}**: {str(outcome)}"
             await cl.Message(content=error_msg).send()
             continue
+        results.append(outcome)
     
-    # Store results globally
-    processed_results = results
+    # Store results in the user's session
+    cl.user_session.set("results", results)
     
     # Summary
     successful = len([r for r in results if r.get('success', False)])
@@ -93,142 +219,209 @@ async def process_files_from_paths(file_paths: List[str]):
     
     await cl.Message(content=summary_msg).send()
 
-async def process_single_file_from_path(file_path: str) -> Dict[str, Any]:
+def _scan_directory(dir_path: str) -> List[tuple]:
+    """List (path, stat) for the regular, non-hidden files in a directory"""
+    
+    files = []
+    with os.scandir(dir_path) as it:
+        for entry in it:
+            if entry.name.startswith('.'):
+                continue
+            try:
+                if entry.is_file():
+                    files.append((entry.path, entry.stat()))
+            except OSError:
+                # Deleted or unreadable since the directory was listed
+                continue
+    return sorted(files, key=lambda item: item[0])
+
+def _dumps(obj) -> bytes:
+    """Encode to UTF-8 JSON, using orjson when it's installed"""
+    
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY, default=str)
+        except TypeError:
+            # orjson rejects some values without calling default, e.g. ints over 64 bits
+            pass
+    return json.dumps(obj, ensure_ascii=False, default=str).encode('utf-8')
+
+def _loads(data: bytes):
+    """Decode UTF-8 JSON, using orjson when it's installed"""
+    
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def _fingerprint(file_path: str) -> str:
+    """Hash file contents in 1 MiB chunks to build a cache key"""
+    
+    h = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+@lru_cache(maxsize=256)
+def _fingerprint_cached(file_path: str, mtime_ns: int, size: int) -> str:
+    """Memoize fingerprints per (path, mtime, size) so unchanged files aren't re-hashed"""
+    
+    return _fingerprint(file_path)
+
+def _load_cached(cache_file: Path, file_path: str, mtime: float):
+    """Return cached extraction results, or None on a miss or unreadable entry.
+
+    Entries are shared by every file with the same contents, so path-derived
+    metadata is rewritten to describe the file actually being processed.
+    """
+    
+    try:
+        with open(cache_file, 'rb') as f:
+            extracted = _loads(f.read())
+    except (OSError, ValueError):
+        return None
+    
+    file_directory, filename = os.path.split(file_path)
+    last_modified = datetime.fromtimestamp(mtime).strftime("%Y-%m-%dT%H:%M:%S%z")
+    for element in extracted['elements'] or ():
+        metadata = element['metadata']
+        if 'filename' in metadata:
+            metadata['filename'] = filename
+        if 'file_directory' in metadata:
+            metadata['file_directory'] = file_directory or None
+        if 'last_modified' in metadata:
+            metadata['last_modified'] = last_modified
+    return extracted
+
+def _store_cached(cache_file: Path, extracted: Dict[str, Any]):
+    """Write extraction results to the cache; failures only cost a future re-parse"""
+    
+    # Encode first: values orjson can't serialize (e.g. ints over 64 bits) just skip caching
+    try:
+        data = _dumps(extracted)
+    except (TypeError, ValueError):
+        return
+    
+    tmp_file = None
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # Unique temp name per write; concurrent writers of the same entry never share one
+        fd, tmp_file = tempfile.mkstemp(dir=cache_file.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # Atomic rename so concurrent sessions never read a half-written entry
+        os.replace(tmp_file, cache_file)
+    except (OSError, TypeError, ValueError):
+        # Drop any partial temp file with a single unlink, no exists() probe first
+        if tmp_file is not None:
+            try:
+                os.unlink(tmp_file)
+            except OSError:
+                pass
+
+def _reset_pool(broken: concurrent.futures.ProcessPoolExecutor):
+    """Replace the shared pool after a worker died, unless another task already did"""
+    
+    global _POOL
+    if _POOL is broken:
+        _POOL = concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count())
+        broken.shutdown(wait=False, cancel_futures=True)
+
+async def _run_in_pool(func, *args):
+    """Run func in the shared process pool, retrying alone if a worker died.
+
+    A killed worker (e.g. OOM) fails every task in flight on that pool. Each
+    of them is retried by itself in a single-use worker, so only the task
+    that crashes on its own fails.
+    """
+    
+    loop = asyncio.get_running_loop()
+    pool = _POOL
+    try:
+        return await loop.run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        _reset_pool(pool)
+    
+    async with _RETRY_LOCK:
+        solo = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+        try:
+            return await loop.run_in_executor(solo, func, *args)
+        finally:
+            solo.shutdown(wait=False)
+
+async def process_single_file_from_path(file_path: str, hires: bool = False, file_stat: os.stat_result = None,
+                                        use_pool: bool = True,
+                                        detail: Literal["full", "summary"] = "full") -> Dict[str, Any]:
     """Process a single file from path and return structured results"""
 
+    name = os.path.basename(file_path)
     try:
+        if file_stat is None:
+            file_stat = await aiofiles.os.stat(file_path)
+        size = file_stat.st_size
+        ext = os.path.splitext(name)[1].lower()
+        
         # Show OCR warning for images
-        file_ext = Path(file_path).suffix.lower()
-        if file_ext in ['.jpg', '.jpeg', '.png', '.tiff', '.bmp']:
+        if ext in IMG_EXTS:
             await cl.Message(content="🔍 **OCR Processing**: This is an image file. OCR text extraction may take a moment...").send()
         
-        # Process with unstructured
-        elements = partition(file_path)
-        
-        # Show processing progress
-        await cl.Message(content=f"📊 **Analyzing structure**: Found {len(elements)} content elements...").send()
-        
-        # Convert to structured format with better error handling
-        structured_data = []
-        word_count = 0
-        processed_count = 0
-        skipped_count = 0
-        
-        for i, element in enumerate(elements):
-            try:
-                # Extract text content safely
-                text = ""
-                if hasattr(element, 'text') and element.text is not None:
-                    text = str(element.text).strip()
-                elif hasattr(element, '__str__'):
-                    text = str(element).strip()
-                
-                # Skip if no meaningful text
-                if not text or len(text) < 2:
-                    continue
-                
-                # Determine element type safely
-                element_type = "unknown"
-                if isinstance(element, Title):
-                    element_type = "title"
-                elif isinstance(element, NarrativeText):
-                    element_type = "narrative"
-                elif isinstance(element, ListItem):
-                    element_type = "list_item"
-                elif isinstance(element, Table):
-                    element_type = "table"
-                elif isinstance(element, Header):
-                    element_type = "header"
-                elif isinstance(element, Footer):
-                    element_type = "footer"
-                elif isinstance(element, Text):
-                    element_type = "text"
-                else:
-                    # Try to get class name for unknown types
-                    class_name = element.__class__.__name__
-                    element_type = class_name.lower()
-                
-                # Extract metadata safely
-                metadata = {}
-                try:
-                    if hasattr(element, 'metadata') and element.metadata is not None:
-                        if hasattr(element.metadata, 'to_dict'):
-                            metadata = element.metadata.to_dict()
-                        elif hasattr(element.metadata, '__dict__'):
-                            metadata = {k: v for k, v in element.metadata.__dict__.items() 
-                                      if not k.startswith('_') and v is not None}
-                        else:
-                            metadata = dict(element.metadata)
-                except Exception:
-                    metadata = {}
-                
-                # Extract coordinates safely
-                coordinates = None
-                try:
-                    if hasattr(element, 'coordinates') and element.coordinates is not None:
-                        if hasattr(element.coordinates, 'to_dict'):
-                            coordinates = element.coordinates.to_dict()
-                        elif hasattr(element.coordinates, '__dict__'):
-                            coordinates = {k: v for k, v in element.coordinates.__dict__.items() 
-                                         if not k.startswith('_') and v is not None}
-                        else:
-                            coordinates = dict(element.coordinates)
-                except Exception:
-                    coordinates = None
-                
-                # Add to structured data
-                structured_data.append({
-                    'type': element_type,
-                    'text': text,
-                    'metadata': metadata,
-                    'coordinates': coordinates,
-                    'element_index': i
-                })
-                
-                # Update counts
-                word_count += len(text.split())
-                processed_count += 1
-                
-                # Show progress every 50 elements
-                if (i + 1) % 50 == 0:
-                    await cl.Message(content=f"📝 **Processing elements**: {i + 1}/{len(elements)} completed...").send()
-                    
-            except Exception as element_error:
-                # Log element processing errors but continue
-                skipped_count += 1
-                if skipped_count <= 10:  # Only show first 10 errors to avoid spam
-                    await cl.Message(content=f"⚠️ **Warning**: Skipped element {i+1} due to processing error: {type(element_error).__name__}: {str(element_error)[:100]}...").send()
-                elif skipped_count == 11:
-                    await cl.Message(content="⚠️ **Note**: Additional element processing errors will be logged but not displayed to avoid spam...").send()
-                continue
+        # Reuse earlier results for identical file contents; hashing and cache
+        # I/O run in threads so they don't stall other sessions
+        cache_file = None
+        extracted = None
+        if size <= CACHE_MAX_FILE_SIZE:
+            digest = await asyncio.to_thread(_fingerprint_cached, file_path, file_stat.st_mtime_ns, size)
+            cache_key = f"v{CACHE_VERSION}-{digest}-{ext.lstrip('.') or 'noext'}"
+            cache_file = CACHE_DIR / f"{cache_key}{'-hires' if hires else ''}{'-summary' if detail == 'summary' else ''}.json"
+            extracted = await asyncio.to_thread(_load_cached, cache_file, file_path, file_stat.st_mtime)
+        from_cache = extracted is not None
+        if not from_cache:
+            # Partition off the event loop; a lone light file runs in a thread to
+            # skip worker startup and pickling the results back
+            if use_pool or ext in _POOL_ONLY_EXTS:
+                extracted = await _run_in_pool(partition_and_structify, file_path, hires, detail)
+            else:
+                extracted = await asyncio.to_thread(partition_and_structify, file_path, hires, detail)
+            if cache_file is not None:
+                await asyncio.to_thread(_store_cached, cache_file, extracted)
+        structured_data = extracted['elements']
+        word_count = extracted['word_count']
+        total_found = extracted['total_elements_found']
+        processed_count = extracted['processed_count']
+        skipped_count = extracted['skipped_count']
         
-        # Show final processing summary
-        summary_msg = f"""📋 **Processing Summary for {os.path.basename(file_path)}**:
-• Total elements found: {len(elements)}
+        # Show final processing summary, with any element errors, in a single message
+        summary_msg = f"""📋 **Processing Summary for {name}**:
+• Total elements found: {total_found}
 • Successfully processed: {processed_count}
 • Skipped due to errors: {skipped_count}
 • Words extracted: {word_count:,}
-• File size: {os.path.getsize(file_path):,} bytes"""
+• Parsing strategy: {extracted['strategy']}{' (cached result)' if from_cache else ''}
+• File size: {size:,} bytes"""
+        
+        if extracted['element_errors']:
+            summary_msg += "\n\n⚠️ **Warnings**:\n" + "\n".join(f"• {error}" for error in extracted['element_errors'])
+            if skipped_count > len(extracted['element_errors']):
+                summary_msg += "\n• Additional element processing errors were skipped but not displayed to avoid spam..."
         
         await cl.Message(content=summary_msg).send()
         
         return {
             'success': True,
-            'filename': os.path.basename(file_path),
+            'filename': name,
             'file_path': file_path,
-            'file_size': os.path.getsize(file_path),
+            'file_size': size,
             'word_count': word_count,
             'elements': structured_data,
-            'element_count': len(structured_data),
-            'file_type': Path(file_path).suffix.lower(),
-            'total_elements_found': len(elements),
+            'element_count': processed_count,
+            'file_type': ext,
+            'total_elements_found': total_found,
             'processed_count': processed_count,
-            'skipped_count': skipped_count
+            'skipped_count': skipped_count,
+            'strategy': extracted['strategy']
         }
         
     except Exception as e:
         # More detailed error information
-        error_details = f"❌ **Processing Error** for {os.path.basename(file_path)}:\n\n"
+        error_details = f"❌ **Processing Error** for {name}:\n\n"
         error_details += f"**Error Type**: {type(e).__name__}\n"
         error_details += f"**Error Message**: {str(e)}\n\n"
         error_details += "**Troubleshooting Tips**:\n"
@@ -243,7 +436,7 @@ async def process_single_file_from_path(file_path: str) -> Dict[str, Any]:
 async def show_processed_content():
     """Show a preview of the processed content"""
     
-    global processed_results # Access the global variable
+    processed_results = cl.user_session.get("results", [])
     
     if not processed_results:
         await cl.Message(content="❌ No processed data to show. Please process some files first.").send()
@@ -279,10 +472,46 @@ async def show_processed_content():
             
             await cl.Message(content=preview_msg).send()
 
+async def _export_json(json_file: str, processed_results: List[Dict[str, Any]]):
+    """Export as JSON, one record at a time so only a single result is encoded in memory"""
+    
+    async with aiofiles.open(json_file, 'wb', buffering=1 << 20) as f:
+        await f.write(b'[\n')
+        for i, result in enumerate(processed_results):
+            await f.write((b',\n' if i else b'') + _dumps(result))
+        await f.write(b'\n]\n')
+
+async def _export_csv(csv_file: str, processed_results: List[Dict[str, Any]]):
+    """Export summary statistics as CSV (simplified)"""
+    
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    writer.writerow(CSV_FIELDS)
+    writer.writerows(_csv_row(r) for r in processed_results if r.get('success', False))
+    async with aiofiles.open(csv_file, 'w', newline='', encoding='utf-8') as f:
+        await f.write(buf.getvalue())
+
+async def _export_text(text_file: str, processed_results: List[Dict[str, Any]]):
+    """Export detailed text content"""
+    
+    async with aiofiles.open(text_file, 'w', encoding='utf-8', buffering=1 << 20) as f:
+        for result in processed_results:
+            if result.get('success', False):
+                # Build each file's section in memory and write it in one call
+                header = (f"\n{'='*50}\n"
+                          f"FILE: {result['filename']}\n"
+                          f"ELEMENTS: {result['element_count']}\n"
+                          f"WORDS: {result['word_count']}\n"
+                          f"{'='*50}\n\n")
+                block = "".join(f"[{element['type'].upper()}]\n{element['text']}\n\n"
+                                for element in result.get('elements') or [])
+                await f.write(header)
+                await f.write(block)
+
 async def export_processed_data():
     """Export processed data in various formats"""
     
-    global processed_results # Access the global variable
+    processed_results = cl.user_session.get("results", [])
     
     if not processed_results:
         await cl.Message(content="❌ No processed data to export. Please process some files first.").send()
@@ -293,33 +522,12 @@ async def export_processed_data():
         export_dir = "exports"
         os.makedirs(export_dir, exist_ok=True)
         
-        # Export as JSON
-        json_file = os.path.join(export_dir, "processed_data.json")
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(processed_results, f, indent=2, ensure_ascii=False, default=str)
-        
-        # Export as CSV (simplified)
-        csv_file = os.path.join(export_dir, "processed_data.csv")
-        with open(csv_file, 'w', encoding='utf-8') as f:
-            f.write("filename,element_count,word_count,file_size,file_type\n")
-            for result in processed_results:
-                if result.get('success', False):
-                    f.write(f"{result['filename']},{result['element_count']},{result['word_count']},{result['file_size']},{result['file_type']}\n")
-        
-        # Export detailed text content
-        text_file = os.path.join(export_dir, "extracted_text.txt")
-        with open(text_file, 'w', encoding='utf-8') as f:
-            for result in processed_results:
-                if result.get('success', False):
-                    f.write(f"\n{'='*50}\n")
-                    f.write(f"FILE: {result['filename']}\n")
-                    f.write(f"ELEMENTS: {result['element_count']}\n")
-                    f.write(f"WORDS: {result['word_count']}\n")
-                    f.write(f"{'='*50}\n\n")
-                    
-                    for element in result.get('elements', []):
-                        f.write(f"[{element['type'].upper()}]\n")
-                        f.write(f"{element['text']}\n\n")
+        # The three exports are independent, so write them concurrently
+        await asyncio.gather(
+            _export_json(os.path.join(export_dir, "processed_data.json"), processed_results),
+            _export_csv(os.path.join(export_dir, "processed_data.csv"), processed_results),
+            _export_text(os.path.join(export_dir, "extracted_text.txt"), processed_results),
+        )
         
         export_msg = f"""📤 **Export Complete!**
 
@@ -340,8 +548,7 @@ You can now download these files from your system."""
 async def clear_session_data():
     """Clear all processed data from the session"""
     
-    global processed_results # Access the global variable
-    processed_results = []
+    cl.user_session.set("results", [])
     await cl.Message(content="🗑️ Session data cleared. You can start fresh!").send()
 
 async def show_help_info():
@@ -352,6 +559,9 @@ async def show_help_info():
 **Commands:**
 • `help` - Show this help message
 • `process /path/to/file.pdf` - Process a file from path
+• `process --hires /path/to/file.pdf` - Force layout analysis/OCR for scanned PDFs
+• `process /path/to/folder` - Process every file in a folder
+• `process --summary /path/to/file.pdf` - Only count elements and words (no content kept)
 • `show` - Preview extracted content
 • `export` - Download results as files
 • `clear` - Clear all processed data
@@ -373,6 +583,7 @@ async def show_help_info():
 • Use absolute paths for best results
 • Large files may take longer to process
 • OCR processing is automatic for images
+• PDFs use fast text extraction and fall back to OCR when little text is found
 • Results are stored in memory until exported
 
 **Need help?** Type `help` anytime!"""
@@ -404,29 +615,32 @@ Try processing a file and see the magic happen! 🚀"""
     
     await cl.Message(content=demo_msg).send()
 
+# Command verb -> handler; 'process' takes arguments and is dispatched separately
+COMMANDS = {
+    'help': show_help_info, '?': show_help_info, 'info': show_help_info,
+    'show': show_processed_content, 'preview': show_processed_content, 'view': show_processed_content,
+    'export': export_processed_data, 'download': export_processed_data, 'save': export_processed_data,
+    'clear': clear_session_data, 'reset': clear_session_data, 'new': clear_session_data,
+    'demo': run_demo, 'example': run_demo, 'sample': run_demo,
+}
+
 @cl.on_message
 async def handle_message(message: cl.Message):
     """Handle user messages"""
 
-    content = message.content.lower().strip()
+    parts = message.content.strip().split()
+    verb = parts[0].lower() if parts else ''
 
-    if content in ['help', '?', 'info']:
-        await show_help_info()
-    elif content.startswith('process'):
-        parts = message.content.split()
-        if len(parts) > 1:
-            file_paths = parts[1:]
-            await process_files_from_paths(file_paths)
+    if verb == 'process':
+        flags = {p for p in parts[1:] if p.startswith('--')}
+        file_paths = [p for p in parts[1:] if not p.startswith('--')]
+        detail = "summary" if '--summary' in flags else "full"
+        if file_paths:
+            await process_files_from_paths(file_paths, hires='--hires' in flags, detail=detail)
         else:
             await cl.Message(content="❌ Please provide file paths. Example: 'process /path/to/your/file.pdf'").send()
-    elif content in ['show', 'preview', 'view']:
-        await show_processed_content() # New command
-    elif content in ['export', 'download', 'save']:
-        await export_processed_data()
-    elif content in ['clear', 'reset', 'new']:
-        await clear_session_data()
-    elif content in ['demo', 'example', 'sample']:
-        await run_demo()
+    elif verb in COMMANDS:
+        await COMMANDS[verb]()
     else:
         await cl.Message(content="💡 **Tip**: Type 'help' for instructions, 'process /path/to/file.pdf' to start processing, 'show' to preview content, 'export' to download results, or 'demo' to see a sample workflow!").send()
 
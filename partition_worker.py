@@ -0,0 +1,167 @@
+"""Partitioning code that runs inside the process pool.
+
+Kept in its own importable module: Chainlit loads ``dataset_processor.py``
+under a module name that worker processes can't import, so anything sent to
+the pool has to live here to be picklable.
+"""
+
+import os
+from typing import Dict, Any, Literal
+from unstructured.partition.auto import partition
+from unstructured.documents.elements import Title, NarrativeText, ListItem, Table, Header, Footer, Text
+
+# PDFs whose fast text pass yields fewer characters than this are retried with hi_res/OCR
+FAST_TEXT_THRESHOLD = 100
+
+# Image extensions that go straight to OCR
+IMG_EXTS = frozenset({'.jpg', '.jpeg', '.png', '.tiff', '.bmp'})
+
+# Element type names; shared constants so thousands of elements reuse one string each
+TITLE = "title"
+NARRATIVE = "narrative"
+LIST_ITEM = "list_item"
+TABLE = "table"
+HEADER = "header"
+FOOTER = "footer"
+TEXT = "text"
+
+# Element class -> exported type name, checked in this order for subclasses
+_TYPE_MAP = {
+    Title: TITLE,
+    NarrativeText: NARRATIVE,
+    ListItem: LIST_ITEM,
+    Table: TABLE,
+    Header: HEADER,
+    Footer: FOOTER,
+    Text: TEXT,
+}
+_TYPE_BASES = tuple(_TYPE_MAP.items())
+
+# Shared metadata for elements that have none. Read-only: never mutate it downstream
+_EMPTY = {}
+
+def _to_dict(obj):
+    """Convert unstructured metadata/coordinates objects via their own to_dict"""
+    
+    return obj.to_dict() if obj is not None and hasattr(obj, 'to_dict') else None
+
+def _element_type(element) -> str:
+    """Map an element to its type name with one dict lookup per element"""
+    
+    cls = element.__class__
+    element_type = _TYPE_MAP.get(cls)
+    if element_type is None:
+        # Subclasses resolve like an isinstance chain; the answer is remembered per class
+        element_type = next((name for base, name in _TYPE_BASES if isinstance(element, base)), cls.__name__.lower())
+        _TYPE_MAP[cls] = element_type
+    return element_type
+
+def _partition_file(file_path: str, hires: bool = False):
+    """Partition a file, only paying for layout models/OCR when needed.
+
+    Returns the elements and the strategy that produced them.
+    """
+    
+    file_ext = os.path.splitext(file_path)[1].lower()
+    
+    # Images always need OCR
+    if file_ext in IMG_EXTS:
+        strategy = "hi_res" if hires else "ocr_only"
+        return partition(file_path, strategy=strategy, languages=["eng"]), strategy
+    
+    if file_ext == '.pdf':
+        if not hires:
+            # Try direct text extraction first; escalate only if it comes back near-empty
+            elements = partition(file_path, strategy="fast", languages=["eng"])
+            if sum(len(getattr(e, 'text', None) or "") for e in elements) >= FAST_TEXT_THRESHOLD:
+                return elements, "fast"
+        return partition(file_path, strategy="hi_res", languages=["eng"]), "hi_res"
+    
+    return partition(file_path), "auto"
+
+def _element_text(element) -> str:
+    """Return an element's stripped text; elements without text yield an empty string"""
+    
+    return element.text.strip() if getattr(element, 'text', None) else ""
+
+def _structify_element(i: int, element):
+    """Convert one element to a plain dict, or None if it has no meaningful text"""
+    
+    text = _element_text(element)
+    
+    # Skip if no meaningful text
+    if len(text) < 2:
+        return None
+    
+    # One to_dict per element; coordinates live inside the element's metadata and
+    # are moved to their own field so exports and cache entries carry them once
+    metadata = _to_dict(element.metadata) or _EMPTY
+    coordinates = metadata.pop('coordinates', None) if metadata else None
+    
+    return {
+        'type': _element_type(element),
+        'text': text,
+        'word_count': len(text.split()),
+        'metadata': metadata,
+        'coordinates': coordinates,
+        'element_index': i
+    }
+
+def partition_and_structify(file_path: str, hires: bool = False,
+                             detail: Literal["full", "summary"] = "full") -> Dict[str, Any]:
+    """Partition a file and convert its elements to plain dicts.
+
+    Runs inside the process pool, so it must stay top-level and return only
+    picklable data; Chainlit messaging is left to the async caller. With
+    ``detail="summary"`` only counts are kept and ``elements`` is None.
+    """
+    
+    # Process with unstructured
+    elements, strategy = _partition_file(file_path, hires)
+    
+    # Convert to structured format with better error handling. Summary mode only
+    # reads each element's text; metadata conversion and dict building are skipped
+    summary = detail == "summary"
+    structured_data = []
+    processed_count = 0
+    word_count = 0
+    skipped_count = 0
+    element_errors = []
+    
+    # Bind hot-loop lookups once instead of resolving them per element
+    structify = _structify_element
+    element_text = _element_text
+    append = structured_data.append
+    
+    for i, element in enumerate(elements):
+        try:
+            if summary:
+                text = element_text(element)
+                if len(text) < 2:
+                    continue
+                words = len(text.split())
+            else:
+                entry = structify(i, element)
+                if entry is None:
+                    continue
+                words = entry['word_count']
+                append(entry)
+            processed_count += 1
+            word_count += words
+            
+        except Exception as element_error:
+            # Record element processing errors but continue
+            skipped_count += 1
+            if skipped_count <= 10:  # Only keep first 10 errors to avoid spam
+                element_errors.append(f"Skipped element {i+1} due to processing error: {type(element_error).__name__}: {str(element_error)[:100]}...")
+            continue
+    
+    return {
+        'elements': None if summary else structured_data,
+        'word_count': word_count,
+        'total_elements_found': len(elements),
+        'processed_count': processed_count,
+        'skipped_count': skipped_count,
+        'element_errors': element_errors,
+        'strategy': strategy
+    }